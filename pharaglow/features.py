@@ -1,17 +1,19 @@
 #!/usr/bin/env python
 
 """features.py: image analysis of pharynx. Uses skimage to provide image functionality."""
+from collections import deque
+from functools import lru_cache
+import cv2
 import pims
 import numpy as np
-from numpy.linalg import norm
+from numba import njit
+from scipy import ndimage as ndi
 from scipy.stats import skew
-from scipy.cluster.hierarchy import linkage, leaves_list
 from scipy.optimize import curve_fit
-from skimage.morphology import skeletonize, disk, remove_small_holes, remove_small_objects, binary_closing, binary_opening
-from skimage import img_as_float
+from skimage import img_as_ubyte
+from skimage.morphology import skeletonize, remove_small_holes, remove_small_objects, binary_closing, binary_opening
 from skimage.segmentation import morphological_chan_vese, checkerboard_level_set
-from skimage.transform import rescale
-from skimage.filters import rank, threshold_otsu, threshold_yen, gaussian
+from skimage.filters import threshold_otsu, threshold_yen, gaussian
 from skimage.measure import find_contours, profile_line, regionprops, label
 
 
@@ -35,6 +37,25 @@ def find_lawn(image, smooth = 1, area_holes = 15000, area_spots = 50000):
     binary = remove_small_objects(binary, min_size=area_spots, connectivity=8, in_place=False)
     return binary
 
+def intensityHistogram(img):
+    """Count the pixel intensities of an 8-bit image with a single bincount.
+    Like skimage.exposure.histogram, the histogram spans only the intensity range of the image.
+
+    Args:
+        img (numpy.array or pims.Frame): image
+
+    Returns:
+        tuple or None: (counts, bin_centers) of the histogram, None if the image is not uint8.
+    """
+
+    if img.dtype != np.uint8:
+        return None
+    counts = np.bincount(np.ravel(img), minlength=256)
+    values = np.flatnonzero(counts)
+    start, end = values[0], values[-1]+1
+    return counts[start:end], np.arange(start, end)
+
+
 @pims.pipeline
 def thresholdPharynx(img):
     """Use Yen threshold to obtain mask of pharynx.
@@ -46,7 +67,7 @@ def thresholdPharynx(img):
         np.array: binary image with only the largest object
     """
 
-    mask = img>threshold_yen(img)
+    mask = img>threshold_yen(img, hist=intensityHistogram(img))
     mask = binary_opening(mask)
     mask = binary_closing(mask)
     labeled = label(mask)
@@ -71,23 +92,73 @@ def skeletonPharynx(mask):
 
     return skeletonize(mask)
 
+# 8-connected neighbourhood, direct neighbours first
+NEIGHBOURS = ((-1, 0), (1, 0), (0, -1), (0, 1), (-1, -1), (-1, 1), (1, -1), (1, 1))
+
+
 @pims.pipeline
 def sortSkeleton(skeleton):
-    """Use hierarchical clustering with optimal ordering to get \
-        the best path through the skeleton points.
+    """Follow the longest path between two ends of the skeleton to get \
+        the best path through the skeleton points. Side branches are pruned.
 
     Args:
         skeleton (numpy.array): skeletonized image of an object
 
     Returns:
-        list: list of coordinates ordered by distance
+        list: indices of the skeleton coordinates (as returned by np.where) ordered along the path
     """
 
     # coordinates of skeleton
     ptsX, ptsY = np.where(skeleton)
-    # cluster
-    Z = linkage(np.c_[ptsX, ptsY], method='average', metric='cityblock', optimal_ordering=True)
-    return leaves_list(Z)
+    nPts = len(ptsX)
+    # lookup of point indices, padded by one pixel so neighbours never leave the image
+    index = np.full((skeleton.shape[0]+2, skeleton.shape[1]+2), -1)
+    index[ptsX+1, ptsY+1] = np.arange(nPts)
+
+    def breadthFirst(start):
+        # steps along the skeleton from start and the preceding point on the way
+        dist = np.full(nPts, -1)
+        parent = np.full(nPts, -1)
+        dist[start] = 0
+        queue = deque([start])
+        while queue:
+            i = queue.popleft()
+            x, y = ptsX[i]+1, ptsY[i]+1
+            for dx, dy in NEIGHBOURS:
+                j = index[x+dx, y+dy]
+                if j >= 0 and dist[j] < 0:
+                    dist[j] = dist[i] + 1
+                    parent[j] = i
+                    queue.append(j)
+        return dist, parent
+
+    # the point furthest away along the skeleton is one end of its longest path
+    dist, _ = breadthFirst(0)
+    start = np.argmax(dist)
+    # the point furthest away from there is the other end
+    dist, parent = breadthFirst(start)
+    current = np.argmax(dist)
+    # trace the path back, pixels on side branches are not part of it
+    order = [current]
+    while current != start:
+        current = parent[current]
+        order.append(current)
+    return np.array(order[::-1])
+
+
+def _cubic(x, p0, p1, p2, p3):
+    """ Cubic polynomial p0 + p1*x + p2*x**2 + p3*x**3 evaluated with Horner's scheme."""
+    return p0 + x*(p1 + x*(p2 + x*p3))
+
+
+def _cubicDeriv(x, p0, p1, p2, p3):
+    """ First derivative of _cubic."""
+    return p1 + x*(2*p2 + 3*p3*x)
+
+
+# compiled versions of the same polynomial for the centerline kernels
+_cubicJit = njit(cache=True)(_cubic)
+_cubicDerivJit = njit(cache=True)(_cubicDeriv)
 
 
 def pharynxFunc(x, *p, deriv = 0):
@@ -100,10 +171,50 @@ def pharynxFunc(x, *p, deriv = 0):
     Returns:
         numpy.array or list: polynomial evaluated at x
     """
-
     if deriv==1:
-        return p[1] + 2*p[2]*x + 3*p[3]*x**2 #+ 4*p[4]*x**4
-    return p[0] + p[1]*x + p[2]*x**2 + p[3]*x**3 #+ p[4]*x**5
+        return _cubicDeriv(x, p[0], p[1], p[2], p[3])
+    return _cubic(x, p[0], p[1], p[2], p[3])
+
+
+@njit(cache=True)
+def _curvePoints(xs, pX, pY):
+    """ Evaluate pharynxFunc for both axes into one (N,2) array.
+
+    Args:
+        xs (numpy.array): (N,) coordinates to evaluate the polynomials on
+        pX (numpy.array): parameters of pharynxFunc along x
+        pY (numpy.array): parameters of pharynxFunc along y
+
+    Returns:
+        numpy.array: (N,2) points on the curve
+    """
+    out = np.empty((xs.shape[0], 2))
+    for i in range(xs.shape[0]):
+        out[i, 0] = _cubicJit(xs[i], pX[0], pX[1], pX[2], pX[3])
+        out[i, 1] = _cubicJit(xs[i], pY[0], pY[1], pY[2], pY[3])
+    return out
+
+
+@njit(cache=True)
+def _curveNormals(xs, pX, pY):
+    """ Unit vectors (-dy, dx) orthogonal to the curve described by pharynxFunc.
+
+    Args:
+        xs (numpy.array): (N,) coordinates to evaluate the polynomials on
+        pX (numpy.array): parameters of pharynxFunc along x
+        pY (numpy.array): parameters of pharynxFunc along y
+
+    Returns:
+        numpy.array: (N,2) normal vectors
+    """
+    out = np.empty((xs.shape[0], 2))
+    for i in range(xs.shape[0]):
+        dx = _cubicDerivJit(xs[i], pX[0], pX[1], pX[2], pX[3])
+        dy = _cubicDerivJit(xs[i], pY[0], pY[1], pY[2], pY[3])
+        invNorm = 1.0/np.sqrt(dx*dx + dy*dy)
+        out[i, 0] = -dy*invNorm
+        out[i, 1] = dx*invNorm
+    return out
 
 
 def fitSkeleton(ptsX, ptsY, func = pharynxFunc):
@@ -120,6 +231,10 @@ def fitSkeleton(ptsX, ptsY, func = pharynxFunc):
 
     nP = len(ptsX)
     x = np.linspace(0, 100, nP)
+    if func is pharynxFunc:
+        # the polynomial is linear in its parameters, solve both axes with one least-squares fit
+        poptX, poptY = np.polynomial.polynomial.polyfit(x, np.c_[ptsX, ptsY], 3).T
+        return poptX, poptY
     # fit each axis separately
     poptX, _ = curve_fit(func, x, ptsX, p0=(np.mean(ptsX),1,1,0.1))
     poptY, _= curve_fit(func, x, ptsY, p0 = (np.mean(ptsY),1,1,0.1))
@@ -127,7 +242,24 @@ def fitSkeleton(ptsX, ptsY, func = pharynxFunc):
     return poptX, poptY
 
 
-def morphologicalPharynxContour(mask, scale = 4, **kwargs):
+@lru_cache(maxsize=8)
+def _checkerboard(shape, square_size):
+    """ Cached read-only checkerboard level set, all frames of a movie share the same shape.
+
+    Args:
+        shape (tuple): shape of the image
+        square_size (int): size of the checkerboard squares
+
+    Returns:
+        numpy.array: binary checkerboard level set
+    """
+
+    init_ls = checkerboard_level_set(shape, square_size)
+    init_ls.flags.writeable = False
+    return init_ls
+
+
+def morphologicalPharynxContour(mask, scale = 4, nativeResolution = False, **kwargs):
     """ Uses morphological contour finding on a mask image to get a nice outline.
         We will upsample the image to get sub-pixel outlines.
         **kwargs are handed to morphological_chan_vese.
@@ -135,26 +267,53 @@ def morphologicalPharynxContour(mask, scale = 4, **kwargs):
     Args:
         mask (numpy.array):  binary mask of pharynx.
         scale (int, optional): Scale to upsample the image by. Defaults to 4.
+        nativeResolution (bool, optional): Run the level set on the mask without upsampling, scale is ignored.
+            Much faster, but the contour lies on the pixel grid of the mask. Defaults to False.
 
     Returns:
         numpy.array: coordinates of the contour as array of (N,2) coordinates.
     """
 
-    # upscale this image to get accurate contour
-    image = img_as_float(rescale(mask, scale))
+    if nativeResolution:
+        scale = 1
+    # a boolean mask can be reinterpreted as uint8 without a copy
+    mask = np.asarray(mask)
+    mask = mask.view(np.uint8) if mask.dtype == bool else mask.astype(np.uint8)
+    # upscale this image to get accurate contour, nearest neighbour upsampling keeps it binary
+    image = mask.repeat(scale, axis=0).repeat(scale, axis=1)
     # intialize a checkerboard
-    init_ls = checkerboard_level_set(image.shape, 5)
+    init_ls = _checkerboard(image.shape, 5)
     # run morphological contour finding
     snake =  morphological_chan_vese(image, 10, init_level_set=init_ls, **kwargs)
     # let's try the contour
     contour= find_contours(snake, level = 0.5)#, fully_connected='high', positive_orientation='high',)
     # just in case we find multiple, get only the longest contour
-    contour = contour[np.argmax([len(x) for x in contour])]
+    contour = max(contour, key=len)
     cX, cY = np.array(contour/scale).T
     contour = np.stack((cX, cY), axis =1)
     return contour
 
 
+@njit(cache=True)
+def _minSquaredDistance(points, contour, out):
+    """ Smallest squared distance of each point to any of the contour points.
+
+    Args:
+        points (numpy.array): (N,2) array of points
+        contour (numpy.array): (M,2) array describing the contour
+        out (numpy.array): (N,) output array
+    """
+    for j in range(points.shape[0]):
+        best = np.inf
+        for i in range(contour.shape[0]):
+            dx = points[j, 0] - contour[i, 0]
+            dy = points[j, 1] - contour[i, 1]
+            d = dx*dx + dy*dy
+            if d < best:
+                best = d
+        out[j] = best
+
+
 def cropcenterline(poptX, poptY, contour):
     """ Define start and end point of centerline by crossing of contour.
 
@@ -169,11 +328,12 @@ def cropcenterline(poptX, poptY, contour):
     """
 
     xs = np.linspace(-50,150, 200)
-    tmpcl = np.c_[pharynxFunc(xs, *poptX), pharynxFunc(xs, *poptY)]
+    tmpcl = centerline(poptX, poptY, xs)
     # update centerline based on crossing the contour
     # we are looking for two crossing points
-    distClC = np.sum((tmpcl-contour[:,np.newaxis])**2, axis =-1)
-    start, end = np.argsort(np.min(distClC, axis = 0))[:2]
+    minDist = np.empty(len(xs))
+    _minSquaredDistance(tmpcl, np.ascontiguousarray(contour, dtype=np.float64), minDist)
+    start, end = np.argsort(minDist)[:2]
      # update centerline length
     xstart, xend = xs[start],xs[end]
     # check if length makes sense, otherwise retain original
@@ -195,7 +355,7 @@ def centerline(poptX, poptY, xs):
         numpy.array: (N,2) a centerline spanning the length of the pharynx. Same length as xs.
     """
 
-    return np.c_[pharynxFunc(xs, *poptX), pharynxFunc(xs, *poptY)]
+    return _curvePoints(np.atleast_1d(np.asarray(xs, dtype=np.float64)), np.asarray(poptX, dtype=np.float64), np.asarray(poptY, dtype=np.float64))
 
 
 def normalVecCl(poptX, poptY, xs):
@@ -211,23 +371,56 @@ def normalVecCl(poptX, poptY, xs):
     """
 
     # make an orthogonal vector to the cl by calculating derivative (dx, dy) and using (-dy, dx) as orthogonal vectors.
-    dCl = np.c_[pharynxFunc(xs, *poptX, deriv = 1), pharynxFunc(xs, *poptY, deriv = 1)]#p.diff(cl, axis=0)
-    dCl =dCl[:,::-1]
-    # normalize northogonal vectors
-    dCl[:,0] *=-1
-    dClnorm = norm(dCl, axis = 1)
-    dCl = dCl/np.repeat(dClnorm[:,np.newaxis], 2, axis =1)
-    #dCl = dCl/dClnorm[:,np.newaxis]
-    return dCl
+    return _curveNormals(np.atleast_1d(np.asarray(xs, dtype=np.float64)), np.asarray(poptX, dtype=np.float64), np.asarray(poptY, dtype=np.float64))
+
+
+def _profileLengths(dcl):
+    """ Number of samples profile_line takes along each segment, it includes both end points.
+
+    Args:
+        dcl (numpy.array): (n,2) array of segment vectors, e.g. np.diff(cl, axis=0)
+
+    Returns:
+        numpy.array: (n,) number of samples per segment
+    """
+    return np.ceil(np.hypot(dcl[:,0], dcl[:,1]) + 1).astype(int)
+
+
+def centerlineProfileCoordinates(cl, linewidth = 1):
+    """ Sampling coordinates of line profiles along all segments of a centerline.
+        Each segment cl[i] to cl[i+1] is sampled like skimage.measure.profile_line does.
+
+    Args:
+        cl (numpy.array or list): (n,2) list of centerline coordinates in image space.
+        linewidth (int, optional): width of the scan perpendicular to the centerline. Defaults to 1.
+
+    Returns:
+        numpy.array: (2, K, linewidth) array of coordinates. K is the summed length of all segment profiles.
+    """
+
+    cl = np.asarray(cl, dtype=float)
+    dcl = np.diff(cl, axis=0)
+    lengths = _profileLengths(dcl)
+    segment = np.repeat(np.arange(len(dcl)), lengths)
+    # relative position along the segment for each sample
+    pos = np.arange(lengths.sum()) - np.repeat(np.cumsum(lengths) - lengths, lengths)
+    pos = pos/np.maximum(lengths - 1, 1)[segment]
+    line = cl[:-1][segment] + pos[:,np.newaxis]*dcl[segment]
+    # offsets perpendicular to each segment, in the order profile_line returns them
+    theta = np.arctan2(dcl[:,0], dcl[:,1])
+    perp = np.c_[np.cos(theta), np.sin(-theta)]*(linewidth - 1)/2
+    steps = np.linspace(1, -1, linewidth)
+    coords = line[:,np.newaxis] + steps[np.newaxis,:,np.newaxis]*perp[segment][:,np.newaxis]
+    return np.moveaxis(coords, -1, 0)
 
 
 def intensityAlongCenterline(im, cl, **kwargs):
     """ Create an intensity kymograph along the centerline.
 
     Args:
-        im (numpy.array): image of a pharynx
+        im (numpy.array): image of a pharynx, grayscale or multichannel with channels last
         cl (numpy.array or list): (n,2) list of centerline coordinates in image space.
-        kwargs: **kwargs are passed skimage.measure.profile_line.
+        kwargs: linewidth, order, cval and reduce_func as in skimage.measure.profile_line, the mode is always 'constant'.
 
     Returns:
         numpy.array: array of (?,) length. Length is determined by pathlength of centerline.
@@ -236,8 +429,61 @@ def intensityAlongCenterline(im, cl, **kwargs):
     if 'width' in kwargs:
         w = kwargs['width']
         kwargs.pop('width', None)
-        return np.concatenate([profile_line(im, cl[i], cl[i+1], linewidth = w[i], mode = 'constant', **kwargs) for i in range(len(cl)-1)])
-    return np.concatenate([profile_line(im, cl[i], cl[i+1],mode = 'constant', **kwargs) for i in range(len(cl)-1)])
+        # write each segment profile into a preallocated output, lengths as computed by profile_line
+        dcl = np.diff(np.asarray(cl, dtype=float), axis=0)
+        bounds = np.r_[0, np.cumsum(_profileLengths(dcl))]
+        kymo = np.empty(bounds[-1])
+        for i in range(len(cl)-1):
+            kymo[bounds[i]:bounds[i+1]] = profile_line(im, cl[i], cl[i+1], linewidth = w[i], mode = 'constant', **kwargs)
+        return kymo
+    # sample all segments at once instead of calling profile_line for each segment
+    im = np.asarray(im)
+    order = kwargs.get('order')
+    if order is None:
+        order = 0 if im.dtype == bool else 1
+    coords = centerlineProfileCoordinates(cl, kwargs.get('linewidth', 1))
+    # multichannel images are sampled channel by channel, channels last like profile_line
+    channels = [im] if im.ndim == 2 else [im[..., c] for c in range(im.shape[2])]
+    pixels = [ndi.map_coordinates(channel, coords, prefilter = order > 1, order = order,\
+                                 mode = 'grid-constant', cval = kwargs.get('cval', 0.0)) for channel in channels]
+    pixels = pixels[0] if im.ndim == 2 else np.stack(pixels, axis = -1)
+    reduce_func = kwargs.get('reduce_func', np.mean)
+    if reduce_func is None:
+        return pixels
+    try:
+        return reduce_func(pixels, axis = 1)
+    except TypeError:
+        # function doesn't allow axis kwarg
+        return np.apply_along_axis(reduce_func, 1, pixels)
+
+
+@njit(cache=True)
+def _widthCore(cl, contour, dCl, c1, c2):
+    """ Find the contour points with the smallest and largest angle relative to the normal vector of each centerline point.
+
+    Args:
+        cl (numpy.array): (N,2) array describing the centerline
+        contour (numpy.array): (M,2) array describing the contour
+        dCl (numpy.array): (N,2) array describing the normal vectors on the centerline
+        c1 (numpy.array): (N,) output array for the contour indices of the smallest angles
+        c2 (numpy.array): (N,) output array for the contour indices of the largest angles
+    """
+    for i in range(cl.shape[0]):
+        amin, amax = np.inf, -np.inf
+        for j in range(contour.shape[0]):
+            dx = cl[i, 0] - contour[j, 0]
+            dy = cl[i, 1] - contour[j, 1]
+            d = np.sqrt(dx*dx + dy*dy)
+            # a contour point on the centerline has no direction
+            if d == 0:
+                continue
+            angle = (dx*dCl[i, 0] + dy*dCl[i, 1])/d
+            if angle < amin:
+                amin = angle
+                c1[i] = j
+            if angle > amax:
+                amax = angle
+                c2[i] = j
 
 
 def widthPharynx(cl, contour, dCl):
@@ -253,15 +499,13 @@ def widthPharynx(cl, contour, dCl):
         numpy.array: (N,2) widths of the contour at each centerline point.
     """
 
-    # all possible vectors between contour and centerline
-    vCCl = cl[np.newaxis, :] - contour[:,np.newaxis]
-    # get normed vectors
-    vCClnorm = norm(vCCl, axis = 2)
-    vCCl = vCCl/vCClnorm[:,:,np.newaxis]
-    # calculate relative angles between centerline and contour-centerline vectors
-    angles = np.sum(vCCl*dCl, axis =-1)
-    c1 = np.argmin(angles, axis=0)
-    c2 = np.argmax(angles, axis=0)
+    cl = np.ascontiguousarray(cl, dtype=np.float64)
+    contour = np.ascontiguousarray(contour, dtype=np.float64)
+    dCl = np.ascontiguousarray(dCl, dtype=np.float64)
+    # relative angles between normal vectors and contour-centerline vectors
+    c1 = np.zeros(len(cl), dtype=np.int64)
+    c2 = np.zeros(len(cl), dtype=np.int64)
+    _widthCore(cl, contour, dCl, c1, c2)
     # new widths
     widths = np.stack([contour[c1], contour[c2]], axis=1)
     return widths
@@ -298,16 +542,48 @@ def straightenPharynx(im, xstart, xend, poptX, poptY, width, nPts = 100):
     # use linescans to generate straightened animal
     xn = np.linspace(xstart,xend, nPts)
     clF = centerline(poptX, poptY, xn)
-
     # make vectors orthogonal to the cl
     dCl = normalVecCl(poptX, poptY, xn)
-    # create lines intersection the pharynx orthogonal to midline
-    widths = np.stack([clF+width*dCl, clF-width*dCl], axis=1)
-    # get the intensity profile along these lines
-    kymo = [profile_line(im, pts[0], pts[1], linewidth=1, order=3, mode = 'constant') for pts in widths]
-    # interpolate to obtain straight image
-    tmp = [np.interp(np.arange(-width, width), np.arange(-len(ky)/2, len(ky)/2), ky) for ky in kymo]
-    return np.array(tmp)
+    # sample all lines orthogonal to the midline at once, at unit steps from +width to -width
+    offsets = np.arange(width, -width-1, -1)
+    coords = clF[:,np.newaxis] + offsets[np.newaxis,:,np.newaxis]*dCl[:,np.newaxis]
+    kymo = ndi.map_coordinates(np.asarray(im), np.moveaxis(coords, -1, 0), order=3, mode = 'grid-constant')
+    # interpolate to obtain straight image, the 2*width pixels lie halfway between the samples
+    kymo = kymo.astype(np.float64)
+    return 0.5*(kymo[:,:-1] + kymo[:,1:])
+
+
+def crossMedian(im):
+    """ Median filter with the cross-shaped footprint disk(1), identical to skimage.filters.rank.median(im, disk(1)).
+    Pixels outside the image are ignored, of an even number of values the upper median is used.
+
+    Args:
+        im (numpy.array): 8 or 16 bit image
+
+    Returns:
+        numpy.array: median filtered image
+    """
+
+    if im.size == 1:
+        return im.copy()
+    # padding with the largest value makes edge pixels use the upper median of their values
+    fill = np.iinfo(im.dtype).max
+    if min(im.shape) == 1:
+        # images one pixel thick only have neighbours along one axis, take the median of three
+        line = np.pad(im.ravel(), 1, constant_values=fill)
+        a, b, c = line[:-2], line[1:-1], line[2:]
+        return np.maximum(np.minimum(a, c), np.minimum(np.maximum(a, c), b)).reshape(im.shape)
+    pad = np.pad(im, 1, constant_values=fill)
+    up, down, left, right = pad[:-2,1:-1], pad[2:,1:-1], pad[1:-1,:-2], pad[1:-1,2:]
+    # median of five values with a sorting network of min/max operations
+    low = np.maximum(np.minimum(up, down), np.minimum(left, right))
+    high = np.minimum(np.maximum(up, down), np.maximum(left, right))
+    denoised = np.maximum(np.minimum(low, high), np.minimum(np.maximum(low, high), im))
+    # corners only have three values, take the middle one
+    if im.shape[0] > 1 and im.shape[1] > 1:
+        for y, x, dy, dx in ((0, 0, 1, 1), (0, -1, 1, -1), (-1, 0, -1, 1), (-1, -1, -1, -1)):
+            denoised[y, x] = np.sort([im[y, x], im[y+dy, x], im[y, x+dx]])[1]
+    return denoised
 
 
 def gradientPharynx(im):
@@ -320,8 +596,14 @@ def gradientPharynx(im):
         numpy.array: gradient of image
     """
 
-    denoised = rank.median(im, disk(1))
-    gradient = rank.gradient(denoised, disk(1))
+    # 8 and 16 bit images are filtered as they are, like skimage's rank filters others are converted to uint8
+    if im.dtype not in (np.uint8, np.uint16):
+        im = img_as_ubyte(im)
+    # OpenCV needs a C-contiguous array
+    im = np.ascontiguousarray(im)
+    denoised = crossMedian(im)
+    # the 3x3 elliptic kernel is the same as disk(1)
+    gradient = cv2.morphologyEx(denoised, cv2.MORPH_GRADIENT, cv2.getStructuringElement(cv2.MORPH_ELLIPSE, (3, 3)))
     return gradient
 
 
@@ -19,16 +19,19 @@ def runPharaglowSkel(im):
 
     Returns:
         list: binary of image, unraveled
-        list: coordinates of centerline along X
-        list: coordinates of centerline along Y
+        list: coordinates of centerline along X, side branches of the skeleton are pruned
+        list: coordinates of centerline along Y, side branches of the skeleton are pruned
     """
 
     mask = pg.thresholdPharynx(im)
     skel = pg.skeletonPharynx(mask)
-    # if the image is empty or nearly empty
-    if np.sum(mask) == 0 or np.sum(skel)<6:
+    # if the image is empty
+    if np.sum(mask) == 0 or np.sum(skel) == 0:
         return mask.ravel(), np.nan, np.nan
     order = pg.sortSkeleton(skel)
+    # side branches are pruned, the cubic fit needs at least four ordered points
+    if len(order) < 4:
+        return mask.ravel(), np.nan, np.nan
     ptsX, ptsY = np.where(skel)
     ptsX, ptsY = ptsX[order], ptsY[order]
     return mask.ravel(), ptsX, ptsY
@@ -42,6 +45,7 @@ def runPharaglowCL(mask, ptsX, ptsY, length, **kwargs):
         ptsX (list): coordinates of centerline along X
         ptsY (list): coordinates of centerline along Y
         length (list): length of one axis of the image
+        kwargs: scale (int, optional) and nativeResolution (bool, optional) are passed to .features.morphologicalPharynxContour.
 
     Returns:
         list: poptX - optimal fit parameters of .features.pharynxFunc
@@ -58,7 +62,8 @@ def runPharaglowCL(mask, ptsX, ptsY, length, **kwargs):
     # getting centerline and widths along midline
     poptX, poptY = pg.fitSkeleton(ptsX, ptsY)
     scale=  kwargs.pop('scale', 4)
-    contour = pg.morphologicalPharynxContour(mask, scale)
+    nativeResolution = kwargs.pop('nativeResolution', False)
+    contour = pg.morphologicalPharynxContour(mask, scale, nativeResolution = nativeResolution)
     xstart, xend = pg.cropcenterline(poptX, poptY, contour)
     # create uniform spacing along line
     xs = np.linspace(xstart, xend, 100)
@@ -81,7 +86,7 @@ def runPharaglowKymo(im, cl, widths, **kwargs):
     Args:
         im (numpy.array): image of a pharynx
         cl (numpy.array or list): (n,2) list of centerline coordinates in image space.
-        kwargs: **kwargs are passed skimage.measure.profile_line.
+        kwargs: **kwargs are passed to .features.intensityAlongCenterline, which takes the arguments of skimage.measure.profile_line.
 
     Returns:
         numpy.array: array of (?,) length. Length is determined by pathlength of centerline.
@@ -178,7 +183,8 @@ def runPharaglowOnImage(image, framenumber, params, **kwargs):
         #centerline fit
         scale = params.pop('scale', 4)
         parX, parY, xstart, xend, cl, dCl, widths, contour = \
-            runPharaglowCL(mask,skelX, skelY, params['length'], scale = scale)
+            runPharaglowCL(mask,skelX, skelY, params['length'], scale = scale,\
+                           nativeResolution = params.get('nativeResolution', False))
         # image transformation operations
         grad, straightened = runPharaglowImg(image, xstart,xend,\
                                             parX, parY, params['widthStraight'],\
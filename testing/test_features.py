@@ -0,0 +1,137 @@
+#!/usr/bin/env python
+
+"""test_features.py: tests for pharaglow.features. Run with pytest."""
+import numpy as np
+
+import pharaglow.features as pg
+
+
+def straightSkeleton():
+    """ A straight skeleton along row 10 from column 5 to 64."""
+    skel = np.zeros((30, 70), dtype=bool)
+    skel[10, 5:65] = True
+    return skel
+
+
+def fitDeviation(skel):
+    """ Largest distance of the fitted centerline to row 10."""
+    order = pg.sortSkeleton(skel)
+    ptsX, ptsY = np.where(skel)
+    poptX, poptY = pg.fitSkeleton(ptsX[order], ptsY[order])
+    cl = pg.centerline(poptX, poptY, np.linspace(0, 100, 200))
+    return np.max(np.abs(cl[:,0] - 10))
+
+
+def test_sortSkeleton_straight():
+    skel = straightSkeleton()
+    order = pg.sortSkeleton(skel)
+    _, ptsY = np.where(skel)
+    assert len(order) == skel.sum()
+    assert np.all(np.abs(np.diff(ptsY[order])) == 1)
+
+
+def test_sortSkeleton_prunes_diagonal_branch():
+    skel = straightSkeleton()
+    for k in range(1, 7):
+        skel[10-k, 20+k] = True
+    order = pg.sortSkeleton(skel)
+    ptsX, ptsY = np.where(skel)
+    # only the main line is kept, visited from one end to the other
+    assert np.all(ptsX[order] == 10)
+    assert np.all(np.abs(np.diff(ptsY[order])) == 1)
+    assert fitDeviation(skel) < 0.1
+
+
+def test_sortSkeleton_prunes_orthogonal_branch():
+    skel = straightSkeleton()
+    skel[11:15, 30] = True
+    order = pg.sortSkeleton(skel)
+    ptsX, ptsY = np.where(skel)
+    assert len(order) == 60
+    assert np.all(np.abs(np.diff(ptsY[order])) == 1)
+    assert fitDeviation(skel) < 0.1
+
+
+def test_gradientPharynx_matches_rank_filters():
+    from skimage.filters import rank
+    from skimage.morphology import disk
+    rng = np.random.default_rng(0)
+    for dtype in (np.uint8, np.uint16):
+        im = rng.integers(0, np.iinfo(dtype).max, (31, 17), endpoint=True).astype(dtype)
+        denoised = rank.median(im, disk(1))
+        assert np.array_equal(pg.crossMedian(im), denoised)
+        assert np.array_equal(pg.gradientPharynx(im), rank.gradient(denoised, disk(1)))
+        # thin images have fewer neighbours per pixel
+        for shape in ((1, 1), (1, 2), (1, 7), (9, 1), (2, 2), (2, 5)):
+            im = rng.integers(0, np.iinfo(dtype).max, shape, endpoint=True).astype(dtype)
+            assert np.array_equal(pg.crossMedian(im), rank.median(im, disk(1)))
+    assert np.array_equal(pg.crossMedian(np.array([[5, 9, 3]], dtype=np.uint8)), [[9, 5, 9]])
+
+
+def test_centerline_scalar_and_pharynxFunc_agree():
+    p = [1.0, -0.5, 0.02, -1e-4]
+    xs = np.linspace(0, 100, 7)
+    cl = pg.centerline(p, p, xs)
+    dCl = pg.normalVecCl(p, p, xs)
+    assert np.allclose(cl[:,0], pg.pharynxFunc(xs, *p))
+    assert np.allclose(dCl[:,1]*np.sqrt(2), np.sign(pg.pharynxFunc(xs, *p, deriv = 1)))
+    # a single coordinate gives one point
+    assert pg.centerline(p, p, 50.0).shape == (1, 2)
+    assert pg.normalVecCl(p, p, 50.0).shape == (1, 2)
+
+
+def profileLineReference(im, cl, **kwargs):
+    """ Kymograph as computed with one profile_line call per centerline segment."""
+    from skimage.measure import profile_line
+    return np.concatenate([profile_line(im, cl[i], cl[i+1], mode = 'constant', **kwargs) for i in range(len(cl)-1)])
+
+
+def test_intensityAlongCenterline_matches_profile_line():
+    rng = np.random.default_rng(1)
+    im = rng.random((40, 50))
+    cl = pg.centerline([20, 0.1, 1e-3, -1e-5], [5, 0.35, 1e-3, 0], np.linspace(0, 100, 30))
+    for linewidth in (1, 2, 3, 5):
+        for kwargs in ({}, {'reduce_func': None}, {'order': 3}, {'reduce_func': np.max}):
+            assert np.allclose(pg.intensityAlongCenterline(im, cl, linewidth = linewidth, **kwargs),
+                               profileLineReference(im, cl, linewidth = linewidth, **kwargs))
+    # reduce functions without an axis argument
+    reduce_func = lambda v: v[0] - v[-1]
+    assert np.allclose(pg.intensityAlongCenterline(im, cl, linewidth = 3, reduce_func = reduce_func),
+                       profileLineReference(im, cl, linewidth = 3, reduce_func = reduce_func))
+    # multichannel images
+    rgb = rng.random((40, 50, 3))
+    for kwargs in ({'linewidth': 3}, {'linewidth': 3, 'reduce_func': None}):
+        assert np.allclose(pg.intensityAlongCenterline(rgb, cl, **kwargs), profileLineReference(rgb, cl, **kwargs))
+
+
+def test_widthPharynx_contour_point_on_centerline():
+    cl = np.array([[1.0, 1.0]])
+    dCl = np.array([[1.0, 0.0]])
+    contour = np.array([[1.0, 1.0], [4.0, 1.0], [-2.0, 1.0], [1.0, 3.0]])
+    widths = pg.widthPharynx(cl, contour, dCl)
+    assert np.array_equal(widths[0], [[4.0, 1.0], [-2.0, 1.0]])
+
+
+def test_straightenPharynx_unit_step_midpoints():
+    # on a linear ramp the cubic interpolation is exact away from the border
+    rows, cols = np.mgrid[:60, :60]
+    im = 2.0*rows + 3.0*cols + 10
+    width, nPts = 5, 11
+    # horizontal centerline along row 30, the normal vectors point to -x
+    straight = pg.straightenPharynx(im, 0, 100, [30, 0, 0, 0], [10, 0.3, 0, 0], width, nPts)
+    assert straight.shape == (nPts, 2*width)
+    # 2*width+1 samples at unit steps from +width to -width, averaged to the midpoints between them
+    offsets = width - 0.5 - np.arange(2*width)
+    expected = 2.0*(30 - offsets)[np.newaxis,:] + 3.0*np.linspace(10, 40, nPts)[:,np.newaxis] + 10
+    assert np.allclose(straight, expected)
+
+
+def test_morphologicalPharynxContour_native_resolution():
+    mask = np.zeros((30, 50), dtype=bool)
+    mask[10:20, 8:42] = True
+    contour = pg.morphologicalPharynxContour(mask)
+    native = pg.morphologicalPharynxContour(mask, nativeResolution = True)
+    # the native contour lies on the pixel grid, close to the upsampled one
+    dist = np.sqrt(((native[:,np.newaxis] - contour[np.newaxis])**2).sum(axis=-1)).min(axis=1)
+    assert np.all(dist < 1.5)
+    assert np.allclose(native*2, np.round(native*2))